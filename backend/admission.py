@@ -0,0 +1,109 @@
+import os
+from typing import Any, Callable, Optional
+
+import anyio
+import anyio.to_thread
+
+import metrics
+
+CACHE_READ_CONCURRENCY = max(1, int(os.getenv("DIGEST_CACHE_CONCURRENCY", "16")))
+CACHE_READ_QUEUE = max(0, int(os.getenv("DIGEST_CACHE_QUEUE", "128")))
+CACHE_READ_TIMEOUT_SECONDS = float(os.getenv("DIGEST_CACHE_TIMEOUT_SECONDS", "2"))
+PIPELINE_CONCURRENCY = max(1, int(os.getenv("DIGEST_PIPELINE_CONCURRENCY", "4")))
+PIPELINE_QUEUE = max(0, int(os.getenv("DIGEST_PIPELINE_QUEUE", "8")))
+PIPELINE_TIMEOUT_SECONDS = float(os.getenv("DIGEST_PIPELINE_TIMEOUT_SECONDS", "30"))
+FAST_CONCURRENCY = max(1, int(os.getenv("DIGEST_FAST_CONCURRENCY", "8")))
+FAST_QUEUE = max(0, int(os.getenv("DIGEST_FAST_QUEUE", "32")))
+FAST_TIMEOUT_SECONDS = float(os.getenv("DIGEST_FAST_TIMEOUT_SECONDS", "10"))
+UPGRADE_CONCURRENCY = max(1, int(os.getenv("DIGEST_UPGRADE_CONCURRENCY", "1")))
+UPGRADE_QUEUE = max(0, int(os.getenv("DIGEST_UPGRADE_QUEUE", "8")))
+UPGRADE_TIMEOUT_SECONDS = float(os.getenv("DIGEST_UPGRADE_TIMEOUT_SECONDS", "300"))
+RETRY_AFTER_SECONDS = max(1, int(os.getenv("DIGEST_RETRY_AFTER_SECONDS", "5")))
+
+
+class Overloaded(Exception):
+    def __init__(self, gate: str, retry_after: int):
+        super().__init__(f"{gate} is at capacity")
+        self.gate = gate
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """
+    Concurrency limit plus a bounded wait queue for blocking work. Admitted calls run on the gate's
+    own thread limiter, so a backlog here never occupies FastAPI's shared threadpool, and waiting
+    callers hold no thread at all. Callers beyond the queue bound, or that wait past the timeout,
+    get Overloaded.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, timeout: float, retry_after: int):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.waiting = 0
+        self.active = 0
+        self._slots: Optional[anyio.Semaphore] = None
+        self._threads: Optional[anyio.CapacityLimiter] = None
+
+    def _publish(self) -> None:
+        metrics.set_gauge(f"admission.{self.name}.waiting", self.waiting)
+        metrics.set_gauge(f"admission.{self.name}.active", self.active)
+
+    def _reject(self, reason: str) -> Overloaded:
+        metrics.incr(f"admission.{self.name}.rejected.{reason}")
+        return Overloaded(self.name, self.retry_after)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._slots is None:
+            # Created lazily so they bind to the running event loop.
+            self._slots = anyio.Semaphore(self.limit)
+            self._threads = anyio.CapacityLimiter(self.limit)
+
+        if self._slots.value == 0 and self.waiting >= self.max_queue:
+            raise self._reject("queue_full")
+
+        self.waiting += 1
+        self._publish()
+        try:
+            with anyio.fail_after(self.timeout):
+                await self._slots.acquire()
+        except TimeoutError:
+            raise self._reject("timeout")
+        finally:
+            self.waiting -= 1
+            self._publish()
+
+        self.active += 1
+        self._publish()
+        try:
+            return await anyio.to_thread.run_sync(fn, *args, limiter=self._threads)
+        finally:
+            self.active -= 1
+            self._slots.release()
+            self._publish()
+
+    def snapshot(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "limit": self.limit,
+            "maxQueue": self.max_queue,
+        }
+
+
+cache_gate = AdmissionGate(
+    "cache", CACHE_READ_CONCURRENCY, CACHE_READ_QUEUE, CACHE_READ_TIMEOUT_SECONDS, 1
+)
+pipeline_gate = AdmissionGate(
+    "pipeline", PIPELINE_CONCURRENCY, PIPELINE_QUEUE, PIPELINE_TIMEOUT_SECONDS, RETRY_AFTER_SECONDS
+)
+fast_gate = AdmissionGate(
+    "fast", FAST_CONCURRENCY, FAST_QUEUE, FAST_TIMEOUT_SECONDS, RETRY_AFTER_SECONDS
+)
+# Background fast->full upgrades get their own slots and queue, so they never hold capacity that
+# interactive cache misses need on pipeline_gate.
+upgrade_gate = AdmissionGate(
+    "upgrade", UPGRADE_CONCURRENCY, UPGRADE_QUEUE, UPGRADE_TIMEOUT_SECONDS, RETRY_AFTER_SECONDS
+)
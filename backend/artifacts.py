@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from db import save_artifact, get_artifact, prune_artifacts
+
+# Cluster assignments and labels are content-addressed, so they can live much longer than the paper set.
+# Rows older than this are deleted (0 keeps everything).
+ARTIFACT_TTL_HOURS = int(os.getenv("ARTIFACT_CACHE_TTL_HOURS", "168"))
+# Finished weeks never change, so monthly roll-ups keep them for the widest window (90 days) plus a week.
+WEEK_RETENTION_HOURS = int(os.getenv("WEEK_ARTIFACT_RETENTION_HOURS", str(98 * 24)))
+PRUNE_INTERVAL_SECONDS = 3600
+
+_last_prune = 0.0
+_prune_lock = threading.Lock()
+
+
+def _maybe_prune() -> None:
+    """Drop expired artifacts at most once per PRUNE_INTERVAL_SECONDS (and on the first save)."""
+    global _last_prune
+    if ARTIFACT_TTL_HOURS <= 0:
+        return
+    with _prune_lock:
+        now = time.monotonic()
+        if _last_prune and now - _last_prune < PRUNE_INTERVAL_SECONDS:
+            return
+        _last_prune = now
+    prune_artifacts(ARTIFACT_TTL_HOURS, retain={"week": max(WEEK_RETENTION_HOURS, ARTIFACT_TTL_HOURS)})
+
+
+def _fingerprint(*parts: Any) -> str:
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def papers_key(topic: str, days: int) -> str:
+    return f"papers_{_fingerprint(topic, days)}"
+
+
+def clusters_key(papers: List[Dict[str, Any]], k: int) -> str:
+    # Versions are part of the key: a revised abstract must not reuse the old cluster payload.
+    versions = sorted(f"{p['id']}v{p.get('version', 1)}" for p in papers)
+    return f"clusters_{_fingerprint(versions, k)}"
+
+
+def labels_key(cluster_payload: List[Dict[str, Any]], cluster_prompt: str) -> str:
+    return f"labels_{_fingerprint(cluster_payload, cluster_prompt)}"
+
+
+def large_window_key(topic: str, days: int, limit: int, k: int) -> str:
+    return f"large_{_fingerprint(topic, days, limit, k)}"
+
+
+def week_key(topic: str, week_start: str) -> str:
+    return f"week_{_fingerprint(topic, week_start)}"
+
+
+def load_artifact(key: str, ttl_hours: int = ARTIFACT_TTL_HOURS) -> Optional[Any]:
+    row = get_artifact(key, ttl_hours)
+    if not row:
+        return None
+    try:
+        return json.loads(row["payload_json"])
+    except ValueError:
+        return None
+
+
+def store_artifact(key: str, stage: str, value: Any) -> None:
+    save_artifact(key, stage, json.dumps(value, ensure_ascii=False))
+    _maybe_prune()
+
+
+_maybe_prune()
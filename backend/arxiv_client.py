@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Callable, Dict, Hashable, Iterator
+
+import arxiv
+
+import metrics
+
+ARXIV_PAGE_SIZE = max(1, int(os.getenv("ARXIV_PAGE_SIZE", "25")))
+ARXIV_NUM_RETRIES = max(0, int(os.getenv("ARXIV_NUM_RETRIES", "3")))
+# Process-wide request rate; arXiv's API terms allow at most one request every three seconds.
+ARXIV_REQUESTS_PER_SECOND = float(os.getenv("ARXIV_REQUESTS_PER_SECOND", "0.333"))
+ARXIV_BURST = max(1, int(os.getenv("ARXIV_BURST", "1")))
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+_PRIORITY_RANK = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 1}
+
+_current_priority: ContextVar[str] = ContextVar("arxiv_priority", default=PRIORITY_INTERACTIVE)
+
+
+class TokenBucket:
+    """
+    Blocking token bucket with strict priority: a waiter only gets a token when no
+    higher-priority request is queued.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(rate, 1e-6)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._waiting = [0] * len(_PRIORITY_RANK)
+        self._cond = threading.Condition()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority: str = PRIORITY_INTERACTIVE) -> float:
+        """Block until a token is available; returns the seconds spent waiting."""
+        rank = _PRIORITY_RANK.get(priority, _PRIORITY_RANK[PRIORITY_BACKGROUND])
+        start = time.monotonic()
+        with self._cond:
+            self._waiting[rank] += 1
+            metrics.set_gauge(f"arxiv.queue_depth.{priority}", self._waiting[rank])
+            try:
+                while True:
+                    self._refill()
+                    preempted = any(self._waiting[r] for r in range(rank))
+                    if self._tokens >= 1 and not preempted:
+                        self._tokens -= 1
+                        break
+                    timeout = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.05
+                    self._cond.wait(timeout)
+            finally:
+                self._waiting[rank] -= 1
+                metrics.set_gauge(f"arxiv.queue_depth.{priority}", self._waiting[rank])
+                self._cond.notify_all()
+        return time.monotonic() - start
+
+
+_bucket = TokenBucket(ARXIV_REQUESTS_PER_SECOND, ARXIV_BURST)
+
+
+class _RateLimitedClient(arxiv.Client):
+    """
+    arxiv.Client whose page requests (including retries) go through the shared token bucket
+    instead of the per-client delay_seconds.
+    """
+
+    def _parse_feed(self, url: str, first_page: bool = True, _try_index: int = 0):
+        priority = _current_priority.get()
+        waited = _bucket.acquire(priority)
+        metrics.observe(f"arxiv.queue_wait_seconds.{priority}", waited)
+        if waited > 0.001:
+            metrics.incr("arxiv.throttled_requests")
+        metrics.incr("arxiv.pages_requested")
+        return super()._parse_feed(url, first_page=first_page, _try_index=_try_index)
+
+
+@lru_cache(maxsize=None)
+def get_client(page_size: int = ARXIV_PAGE_SIZE) -> arxiv.Client:
+    """One client per page size; all of them share the same token bucket."""
+    return _RateLimitedClient(page_size=page_size, delay_seconds=0, num_retries=ARXIV_NUM_RETRIES)
+
+
+@contextmanager
+def request_priority(priority: str) -> Iterator[None]:
+    """Tag arXiv page requests made in this context with a priority lane."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_priority() -> str:
+    """Lane of the current context; read it before handing work to another thread."""
+    return _current_priority.get()
+
+
+_inflight: Dict[Hashable, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def dedupe_inflight(key: Hashable, fn: Callable[[], Any]) -> Any:
+    """
+    Run fn once for concurrent callers sharing the same key; followers wait for the leader's result.
+    """
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _inflight[key] = future
+
+    if not leader:
+        metrics.incr("arxiv.deduplicated_requests")
+        return future.result()
+
+    try:
+        result = fn()
+        future.set_result(result)
+        return result
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
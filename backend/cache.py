@@ -1,5 +1,9 @@
 import os
-from typing import Any, Dict, Optional
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Hashable, Optional
 
 from db import (
     save_digest as sqlite_save_digest,
@@ -9,6 +13,8 @@ from db import (
 
 CACHE_BACKEND = os.getenv("DIGEST_CACHE_BACKEND", "sqlite").lower()
 USE_CHROMA_CACHE = CACHE_BACKEND == "chroma"
+L1_MAX_ENTRIES = int(os.getenv("DIGEST_L1_MAX_ENTRIES", "256"))
+L1_TTL_SECONDS = int(os.getenv("DIGEST_L1_TTL_SECONDS", "300"))
 
 if USE_CHROMA_CACHE:
     from chroma_digest_cache import (
@@ -20,6 +26,86 @@ else:
     chroma_save_digest = chroma_get_latest = chroma_get_cached = None  # type: ignore
 
 
+class LRUCache:
+    """
+    Thread-safe in-process LRU bounded by entry count and per-entry age.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max(0, max_entries)
+        self.ttl_seconds = max(0, ttl_seconds)
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        with self._lock:
+            stale = [key for key in self._data if predicate(key)]
+            for key in stale:
+                del self._data[key]
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_l1 = LRUCache(L1_MAX_ENTRIES, L1_TTL_SECONDS)
+
+
+def _latest_key(topic: str, days: int) -> tuple:
+    return ("latest", topic, days)
+
+
+def _cached_key(topic: str, days: int, top_k: int, period: str, voice: bool) -> tuple:
+    return ("cached", topic, days, top_k, period, bool(voice))
+
+
+def _within_ttl(record: Dict[str, Any], ttl_hours: int) -> bool:
+    created_at = record.get("created_at")
+    if not created_at or ttl_hours <= 0:
+        return True
+    try:
+        created = datetime.fromisoformat(created_at)
+    except ValueError:
+        return True
+    if created.tzinfo is None:
+        # The SQLite backend stores naive UTC timestamps.
+        created = created.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - created <= timedelta(hours=ttl_hours)
+
+
+def invalidate_digest(topic: str, days: Optional[int] = None) -> int:
+    """
+    Drop L1 entries for a topic (optionally a single window). Backends are left untouched.
+    """
+    return _l1.invalidate(lambda key: key[1] == topic and (days is None or key[2] == days))
+
+
+def clear_digest_cache() -> None:
+    _l1.clear()
+
+
 def save_digest(
     digest_id: str,
     topic: str,
@@ -33,14 +119,41 @@ def save_digest(
 ) -> None:
     if USE_CHROMA_CACHE and chroma_save_digest:
         chroma_save_digest(digest_id, topic, days, summary, clusters_json, audio_url, top_k, period, voice)
-        return
-    sqlite_save_digest(digest_id, topic, days, summary, clusters_json, audio_url, top_k, period, voice)
+    else:
+        sqlite_save_digest(digest_id, topic, days, summary, clusters_json, audio_url, top_k, period, voice)
+
+    # Write-through: other variants for this window may have been replaced, so drop them before
+    # seeding L1 with the record we just stored.
+    invalidate_digest(topic, days)
+    record = {
+        "id": digest_id,
+        "topic": topic,
+        "days": days,
+        "summary": summary,
+        "clusters_json": clusters_json,
+        "audio_url": audio_url,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "top_k": top_k,
+        "period": period,
+        "voice": bool(voice),
+    }
+    _l1.put(_latest_key(topic, days), record)
+    _l1.put(_cached_key(topic, days, top_k, period, voice), record)
 
 
 def get_latest_digest(topic: str, days: int) -> Optional[Dict[str, Any]]:
+    key = _latest_key(topic, days)
+    record = _l1.get(key)
+    if record is not None:
+        return record
+
     if USE_CHROMA_CACHE and chroma_get_latest:
-        return chroma_get_latest(topic, days)
-    return sqlite_get_latest(topic, days)
+        record = chroma_get_latest(topic, days)
+    else:
+        record = sqlite_get_latest(topic, days)
+    if record:
+        _l1.put(key, record)
+    return record
 
 
 def get_cached_digest(
@@ -51,6 +164,15 @@ def get_cached_digest(
     voice: bool,
     ttl_hours: int,
 ) -> Optional[Dict[str, Any]]:
+    key = _cached_key(topic, days, top_k, period, voice)
+    record = _l1.get(key)
+    if record is not None and _within_ttl(record, ttl_hours):
+        return record
+
     if USE_CHROMA_CACHE and chroma_get_cached:
-        return chroma_get_cached(topic, days, top_k, period, voice, ttl_hours)
-    return sqlite_get_cached(topic, days, top_k, period, voice, ttl_hours)
+        record = chroma_get_cached(topic, days, top_k, period, voice, ttl_hours)
+    else:
+        record = sqlite_get_cached(topic, days, top_k, period, voice, ttl_hours)
+    if record:
+        _l1.put(key, record)
+    return record
@@ -1,11 +1,11 @@
 import os
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from chroma_client import get_collection
-from digest_ids import build_digest_id
 
 DIGEST_COLLECTION = os.getenv("CHROMA_DIGEST_COLLECTION", "digests")
+HISTORY_LIMIT = int(os.getenv("CHROMA_DIGEST_HISTORY", "20"))
 
 
 def _digests_collection():
@@ -13,6 +13,7 @@ def _digests_collection():
 
 
 def _serialize_metadata(
+    digest_id: str,
     topic: str,
     days: int,
     summary: str,
@@ -23,6 +24,7 @@ def _serialize_metadata(
     voice: bool,
 ) -> Dict[str, Any]:
     return {
+        "digest_id": digest_id,
         "topic": topic,
         "days": days,
         "clusters_json": clusters_json,
@@ -34,26 +36,52 @@ def _serialize_metadata(
     }
 
 
-def _extract_record(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+def _extract_records(record: Dict[str, Any]) -> List[Dict[str, Any]]:
     ids = record.get("ids") or []
-    if not ids:
-        return None
     metadatas = record.get("metadatas") or []
     documents = record.get("documents") or []
-    metadata = metadatas[0] if metadatas else {}
-    summary = documents[0] if documents else ""
-    return {
-        "id": ids[0],
-        "topic": metadata.get("topic"),
-        "days": metadata.get("days"),
-        "summary": summary,
-        "clusters_json": metadata.get("clusters_json") or "[]",
-        "audio_url": metadata.get("audio_url"),
-        "top_k": metadata.get("top_k", 5),
-        "period": metadata.get("period", "weekly"),
-        "voice": metadata.get("voice", False),
-        "created_at": metadata.get("created_at"),
-    }
+    out: List[Dict[str, Any]] = []
+    for idx, version_id in enumerate(ids):
+        metadata = (metadatas[idx] if idx < len(metadatas) else None) or {}
+        summary = (documents[idx] if idx < len(documents) else None) or ""
+        out.append({
+            # Legacy rows were stored under the digest id itself and carry no digest_id metadata.
+            "id": metadata.get("digest_id") or version_id,
+            "version_id": version_id,
+            "topic": metadata.get("topic"),
+            "days": metadata.get("days"),
+            "summary": summary,
+            "clusters_json": metadata.get("clusters_json") or "[]",
+            "audio_url": metadata.get("audio_url"),
+            "top_k": metadata.get("top_k", 5),
+            "period": metadata.get("period", "weekly"),
+            "voice": metadata.get("voice", False),
+            "created_at": metadata.get("created_at"),
+        })
+    return out
+
+
+def _query(**filters: Any) -> List[Dict[str, Any]]:
+    """
+    All stored versions matching the metadata filters, newest first.
+    """
+    col = _digests_collection()
+    clauses = [{key: value} for key, value in filters.items()]
+    where = clauses[0] if len(clauses) == 1 else {"$and": clauses}
+    record = col.get(where=where, include=["metadatas", "documents"])
+    if not record or not record.get("ids"):
+        return []
+    records = _extract_records(record)
+    records.sort(key=lambda r: r.get("created_at") or "", reverse=True)
+    return records
+
+
+def _prune_history(topic: str, days: int) -> None:
+    if HISTORY_LIMIT <= 0:
+        return
+    stale = _query(topic=topic, days=days)[HISTORY_LIMIT:]
+    if stale:
+        _digests_collection().delete(ids=[r["version_id"] for r in stale])
 
 
 def save_digest(
@@ -67,29 +95,28 @@ def save_digest(
     period: str,
     voice: bool,
 ) -> None:
+    """
+    Store a new version of the digest. Older versions are kept (up to CHROMA_DIGEST_HISTORY per
+    topic/days) so lookups match the SQLite backend's ORDER BY created_at DESC semantics.
+    """
     col = _digests_collection()
-    metadata = _serialize_metadata(topic, days, summary, clusters_json, audio_url, top_k, period, voice)
+    metadata = _serialize_metadata(digest_id, topic, days, summary, clusters_json, audio_url, top_k, period, voice)
+    version_id = f"{digest_id}@{metadata['created_at']}"
     col.upsert(
-        ids=[digest_id],
+        ids=[version_id],
         documents=[summary],
         metadatas=[metadata],
     )
-
-
-def _get_by_id(digest_id: str) -> Optional[Dict[str, Any]]:
-    col = _digests_collection()
-    record = col.get(ids=[digest_id], include=["metadatas", "documents"])
-    if not record or not record.get("ids"):
-        return None
-    return _extract_record(record)
+    try:
+        _prune_history(topic, days)
+    except Exception:
+        # Pruning is best-effort; the new version is already stored.
+        pass
 
 
 def get_latest_digest(topic: str, days: int) -> Optional[Dict[str, Any]]:
-    digest_id = build_digest_id(topic, days)
-    record = _get_by_id(digest_id)
-    if record and record.get("topic") == topic and record.get("days") == days:
-        return record
-    return None
+    records = _query(topic=topic, days=days)
+    return records[0] if records else None
 
 
 def get_cached_digest(
@@ -100,17 +127,10 @@ def get_cached_digest(
     voice: bool,
     ttl_hours: int,
 ) -> Optional[Dict[str, Any]]:
-    digest_id = build_digest_id(topic, days)
-    record = _get_by_id(digest_id)
-    if not record:
-        return None
-
-    if any([
-        record.get("top_k") != top_k,
-        record.get("period") != period,
-        bool(record.get("voice")) != bool(voice),
-    ]):
+    records = _query(topic=topic, days=days, top_k=top_k, period=period, voice=bool(voice))
+    if not records:
         return None
+    record = records[0]
 
     created_at = record.get("created_at")
     if not created_at or ttl_hours <= 0:
@@ -1,6 +1,6 @@
 import os
 import sqlite3
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 from datetime import datetime, timedelta
 
 DB_PATH = os.getenv("DATABASE_URL", "backend/kensa.db")
@@ -13,7 +13,8 @@ CREATE TABLE IF NOT EXISTS papers (
   title TEXT NOT NULL,
   abstract TEXT NOT NULL,
   url TEXT NOT NULL,
-  published_at TEXT NOT NULL
+  published_at TEXT NOT NULL,
+  authors TEXT
 );
 CREATE TABLE IF NOT EXISTS digests (
   id TEXT PRIMARY KEY,
@@ -29,6 +30,14 @@ CREATE TABLE IF NOT EXISTS digests (
 );
 CREATE INDEX IF NOT EXISTS idx_digests_topic_created ON digests(topic, created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_digests_topic_days_created ON digests(topic, days, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_digests_created_id ON digests(created_at, id);
+CREATE TABLE IF NOT EXISTS artifacts (
+  key TEXT PRIMARY KEY,
+  stage TEXT NOT NULL,
+  payload_json TEXT NOT NULL,
+  created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_created ON artifacts(created_at);
 """
 
 def get_conn() -> sqlite3.Connection:
@@ -58,20 +67,39 @@ def _ensure_digest_columns() -> None:
 
 _ensure_digest_columns()
 
+def _ensure_paper_columns() -> None:
+    existing = {row["name"] for row in _conn.execute("PRAGMA table_info(papers)")}
+    if "authors" not in existing:
+        with _conn:
+            _conn.execute("ALTER TABLE papers ADD COLUMN authors TEXT")
+
+_ensure_paper_columns()
+
+with _conn:
+    _conn.execute("CREATE INDEX IF NOT EXISTS idx_papers_published_id ON papers(published_at, id)")
+
 def upsert_papers(rows: List[Dict[str, Any]]) -> None:
     sql = """
-    INSERT INTO papers(id, title, abstract, url, published_at)
-    VALUES(?,?,?,?,?)
+    INSERT INTO papers(id, title, abstract, url, published_at, authors)
+    VALUES(?,?,?,?,?,?)
     ON CONFLICT(id) DO UPDATE SET
       title=excluded.title,
       abstract=excluded.abstract,
       url=excluded.url,
-      published_at=excluded.published_at
+      published_at=excluded.published_at,
+      authors=excluded.authors
     """
-    vals = [(r["id"], r["title"], r["abstract"], r["url"], r["published_at"]) for r in rows]
+    vals = [(r["id"], r["title"], r["abstract"], r["url"], r["published_at"], r.get("authors")) for r in rows]
     with _conn:
         _conn.executemany(sql, vals)
 
+def get_papers_by_ids(ids: List[str]) -> List[Dict[str, Any]]:
+    if not ids:
+        return []
+    placeholders = ",".join("?" for _ in ids)
+    rows = _conn.execute(f"SELECT * FROM papers WHERE id IN ({placeholders})", ids).fetchall()
+    return [dict(r) for r in rows]
+
 def get_latest_digest(topic: str, days: int) -> Optional[Dict[str, Any]]:
     row = _conn.execute(
         "SELECT * FROM digests WHERE topic=? AND days=? ORDER BY created_at DESC LIMIT 1",
@@ -132,3 +160,98 @@ def save_digest(digest_id: str, topic: str, days: int, summary: str, clusters_js
                 1 if voice else 0
             )
         )
+
+def save_artifact(key: str, stage: str, payload_json: str) -> None:
+    with _conn:
+        _conn.execute(
+            "INSERT OR REPLACE INTO artifacts(key, stage, payload_json, created_at) VALUES(?,?,?,?)",
+            (key, stage, payload_json, datetime.utcnow().isoformat())
+        )
+
+def prune_artifacts(max_age_hours: int, retain: Optional[Dict[str, int]] = None) -> int:
+    """
+    Delete artifacts older than max_age_hours; stages listed in `retain` ({stage: hours}) use their
+    own age limit instead. Returns the number of rows removed.
+    """
+    now = datetime.utcnow()
+    retain = retain or {}
+    cutoff = (now - timedelta(hours=max_age_hours)).isoformat()
+    removed = 0
+    with _conn:
+        if retain:
+            placeholders = ",".join("?" * len(retain))
+            cur = _conn.execute(
+                f"DELETE FROM artifacts WHERE created_at < ? AND stage NOT IN ({placeholders})",
+                (cutoff, *retain),
+            )
+        else:
+            cur = _conn.execute("DELETE FROM artifacts WHERE created_at < ?", (cutoff,))
+        removed += cur.rowcount
+        for stage, hours in retain.items():
+            stage_cutoff = (now - timedelta(hours=hours)).isoformat()
+            cur = _conn.execute("DELETE FROM artifacts WHERE stage=? AND created_at < ?", (stage, stage_cutoff))
+            removed += cur.rowcount
+    return removed
+
+def get_artifact(key: str, ttl_hours: int) -> Optional[Dict[str, Any]]:
+    """
+    Return a stored pipeline artifact if it exists and is still within the TTL window (0 disables expiry).
+    """
+    row = _conn.execute("SELECT * FROM artifacts WHERE key=?", (key,)).fetchone()
+    if not row:
+        return None
+
+    ttl = max(0, ttl_hours)
+    if ttl == 0:
+        return dict(row)
+
+    try:
+        created_at = datetime.fromisoformat(row["created_at"])
+    except ValueError:
+        return None
+    if datetime.utcnow() - created_at <= timedelta(hours=ttl):
+        return dict(row)
+    return None
+
+EXPORT_BATCH_SIZE = 500
+
+def _iter_keyset(table: str, order_col: str, since: Optional[str], until: Optional[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Walk a table in (order_col, id) order, one LIMIT-ed page at a time, resuming after the last
+    key seen. Uses its own connection so a long export never holds the shared one. `until` is
+    exclusive.
+    """
+    conn = get_conn()
+    try:
+        last: Optional[tuple] = None
+        while True:
+            clauses: List[str] = []
+            params: List[Any] = []
+            if since:
+                clauses.append(f"{order_col} >= ?")
+                params.append(since)
+            if until:
+                clauses.append(f"{order_col} < ?")
+                params.append(until)
+            if last:
+                clauses.append(f"({order_col}, id) > (?, ?)")
+                params.extend(last)
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            rows = conn.execute(
+                f"SELECT * FROM {table} {where} ORDER BY {order_col}, id LIMIT ?",
+                (*params, EXPORT_BATCH_SIZE)
+            ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+            last = (rows[-1][order_col], rows[-1]["id"])
+    finally:
+        conn.close()
+
+def iter_papers(since: Optional[str] = None, until: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    return _iter_keyset("papers", "published_at", since, until)
+
+def iter_digests(since: Optional[str] = None, until: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Only covers the SQLite digest store, not the optional Chroma cache backend."""
+    return _iter_keyset("digests", "created_at", since, until)
@@ -0,0 +1,95 @@
+import os
+import re
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import metrics
+
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.85"))
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+SHINGLE_SIZE = 3
+
+_VERSION_RE = re.compile(r"^(?P<base>.+?)(?:v(?P<version>\d+))?$")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+_rng = np.random.default_rng(42)
+_PERM_A = _rng.integers(1, (1 << 31) - 1, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.integers(0, (1 << 31) - 1, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+
+def split_arxiv_id(paper_id: str) -> Tuple[str, int]:
+    """'2501.01234v3' -> ('2501.01234', 3); ids without a version suffix are treated as v1."""
+    match = _VERSION_RE.match(paper_id or "")
+    if not match:
+        return paper_id, 1
+    return match.group("base"), int(match.group("version") or 1)
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    tokens = _TOKEN_RE.findall((text or "").lower())
+    if len(tokens) < SHINGLE_SIZE:
+        shingles = {" ".join(tokens)}
+    else:
+        shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+    # (a * h + b) mod p for every permutation/shingle pair at once; a, b < 2^31 and h < 2^32 keep
+    # the product inside uint64.
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _MERSENNE_PRIME
+    return permuted.min(axis=1)
+
+
+class PaperDeduper:
+    """
+    Incremental dedup: collapses arXiv versions onto their base id and drops near-duplicate
+    abstracts (MinHash + LSH banding). The first paper seen wins, so feed papers newest-first.
+    """
+
+    def __init__(self, threshold: float = NEAR_DUP_THRESHOLD):
+        self.threshold = threshold
+        self._rows = MINHASH_PERMUTATIONS // MINHASH_BANDS
+        self._seen_ids: set = set()
+        self._signatures: List[np.ndarray] = []
+        self._buckets: Dict[Tuple[int, bytes], List[int]] = defaultdict(list)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [
+            (band, signature[band * self._rows:(band + 1) * self._rows].tobytes())
+            for band in range(MINHASH_BANDS)
+        ]
+
+    def _is_near_duplicate(self, signature: np.ndarray, band_keys: List[Tuple[int, bytes]]) -> bool:
+        candidates = {idx for key in band_keys for idx in self._buckets.get(key, ())}
+        if not candidates:
+            return False
+        stacked = np.stack([self._signatures[idx] for idx in candidates])
+        similarity = (stacked == signature[None, :]).mean(axis=1)
+        return bool(similarity.max() >= self.threshold)
+
+    def add(self, paper: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the paper (re-keyed by base id) if it is new, otherwise None."""
+        base_id, version = split_arxiv_id(paper["id"])
+        if base_id in self._seen_ids:
+            metrics.incr("dedup.version_collapsed")
+            return None
+
+        signature = minhash_signature(f"{paper.get('title', '')} {paper.get('abstract', '')}")
+        band_keys = self._band_keys(signature)
+        if self._is_near_duplicate(signature, band_keys):
+            metrics.incr("dedup.near_duplicates")
+            return None
+
+        self._seen_ids.add(base_id)
+        idx = len(self._signatures)
+        self._signatures.append(signature)
+        for key in band_keys:
+            self._buckets[key].append(idx)
+        return {**paper, "id": base_id, "version": version}
+
+    def add_batch(self, papers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        kept = (self.add(p) for p in papers)
+        return [p for p in kept if p is not None]
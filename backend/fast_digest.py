@@ -0,0 +1,126 @@
+from itertools import zip_longest
+from typing import Any, Dict, List
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+from prompt_budget import trim_text
+from services import enrich_top_papers, select_top_papers
+
+KEYWORDS_PER_CLUSTER = 8
+
+
+def ctfidf_keywords(cluster_docs: List[str], top_n: int = KEYWORDS_PER_CLUSTER) -> List[List[str]]:
+    """
+    Class-based TF-IDF: each cluster's abstracts are treated as one document, term frequencies are
+    normalised per cluster and weighted by log(1 + avg words per cluster / term frequency across
+    clusters), so terms that are frequent in one cluster but rare overall rank highest.
+    """
+    if not any(doc.strip() for doc in cluster_docs):
+        return [[] for _ in cluster_docs]
+    vectorizer = CountVectorizer(stop_words="english", ngram_range=(1, 2), token_pattern=r"(?u)\b[a-zA-Z][a-zA-Z\-]+\b")
+    try:
+        counts = vectorizer.fit_transform(cluster_docs).toarray().astype(np.float64)
+    except ValueError:
+        # Every document was stop words only.
+        return [[] for _ in cluster_docs]
+
+    tf = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    avg_words = counts.sum() / len(cluster_docs)
+    idf = np.log(1 + avg_words / np.maximum(counts.sum(axis=0), 1))
+    scores = tf * idf
+
+    terms = vectorizer.get_feature_names_out()
+    keywords = []
+    for row in scores:
+        ranked = [terms[i] for i in np.argsort(row)[::-1] if row[i] > 0]
+        picked: List[str] = []
+        for term in ranked:
+            # Skip unigrams already covered by a chosen bigram (and vice versa).
+            if any(term in p.split() or p in term.split() for p in picked):
+                continue
+            picked.append(term)
+            if len(picked) >= top_n:
+                break
+        keywords.append(picked)
+    return keywords
+
+
+def label_clusters_locally(papers: List[Dict[str, Any]], clusters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Same shape as label_clusters_with_claude's output (label / bullets / topPapers), built from
+    c-TF-IDF keywords and the centroid-ranked representatives in the cluster payload. Largest
+    clusters come first.
+    """
+    by_id = {p["id"]: p for p in papers}
+    members: Dict[int, List[Dict[str, Any]]] = {}
+    for pid, cid in clusters.get("assignments", {}).items():
+        if pid in by_id:
+            members.setdefault(int(cid), []).append(by_id[pid])
+
+    payload = sorted(clusters["payload"], key=lambda c: -len(members.get(c["cluster_id"], c["papers"])))
+    docs = [
+        " ".join(p["abstract"] for p in members.get(c["cluster_id"], c["papers"]))
+        for c in payload
+    ]
+    keywords = ctfidf_keywords(docs)
+
+    labeled = []
+    for cluster, terms in zip(payload, keywords):
+        size = len(members.get(cluster["cluster_id"], cluster["papers"]))
+        bullets = [f"{size} paper{'s' if size != 1 else ''} in this window"]
+        if len(terms) > 3:
+            bullets.append(f"Key terms: {', '.join(terms[3:])}")
+        labeled.append({
+            "label": " / ".join(terms[:3]).title() or "Cluster",
+            "bullets": bullets,
+            "topPapers": [
+                {"title": p["title"], "why": trim_text(p.get("abstract", ""), 30)}
+                for p in cluster["papers"]
+            ],
+        })
+    return enrich_top_papers(labeled, papers)
+
+
+def select_centroid_top_papers(
+    labeled: List[Dict[str, Any]],
+    papers: List[Dict[str, Any]],
+    top_k: int,
+) -> List[Dict[str, Any]]:
+    """Round-robin over clusters (largest first), taking each cluster's nearest-to-centroid papers in turn."""
+    interleaved = [
+        entry
+        for rank in zip_longest(*(c.get("topPapers", []) for c in labeled))
+        for entry in rank
+        if entry
+    ]
+    return select_top_papers([{"topPapers": interleaved}], papers, top_k)
+
+
+def render_fast_digest(
+    topic: str,
+    days: int,
+    period: str,
+    labeled: List[Dict[str, Any]],
+    top_papers: List[Dict[str, Any]],
+) -> str:
+    """Markdown in the same section layout as the LLM-written briefs."""
+    heading = "Monthly Outlook" if period == "monthly" else "Weekly Brief"
+    themes = ", ".join(c["label"] for c in labeled[:3])
+    lines = [
+        f"# {heading}: {topic}",
+        "",
+        "### Executive Summary",
+        f"- {len(labeled)} themes across the last {days} days; the largest are {themes}."
+        if themes else f"- No clear themes across the last {days} days.",
+        "",
+        f"### Top {len(top_papers)} Papers",
+    ]
+    for idx, paper in enumerate(top_papers, start=1):
+        summary = trim_text(paper.get("summary") or "", 30)
+        lines.append(f"{idx}. {paper['title']}" + (f" — {summary}" if summary else ""))
+    lines += ["", "### Cluster Highlights"]
+    for cluster in labeled:
+        lines.append(f"#### {cluster['label']}")
+        lines.extend(f"- {bullet}" for bullet in cluster.get("bullets", [])[:2])
+    return "\n".join(lines).strip() + "\n"
@@ -0,0 +1,173 @@
+import datetime as dt
+import os
+import queue
+import threading
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from arxiv_client import ARXIV_PAGE_SIZE, current_priority, dedupe_inflight, request_priority
+from db import upsert_papers
+from dedup import PaperDeduper
+from services import embed_texts, iter_arxiv, lookup_embeddings, upsert_chroma
+
+INGEST_QUEUE_PAGES = max(1, int(os.getenv("INGEST_QUEUE_PAGES", "4")))
+INGEST_WRITE_BATCH = max(1, int(os.getenv("INGEST_WRITE_BATCH", "100")))
+
+_DONE = object()
+
+
+def chunked(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _embed_with_cache(papers: List[Dict[str, Any]]) -> Tuple[np.ndarray, List[int]]:
+    """Embeddings for papers (cached vectors where Chroma has them) and the indices that were new."""
+    cached = lookup_embeddings([p["id"] for p in papers], {p["id"]: p.get("version", 1) for p in papers})
+    fresh = [i for i, p in enumerate(papers) if p["id"] not in cached]
+    new_embeds = embed_texts([papers[i]["abstract"] for i in fresh]) if fresh else None
+    vectors: List[np.ndarray] = []
+    offset = 0
+    for i, paper in enumerate(papers):
+        if paper["id"] in cached:
+            vectors.append(cached[paper["id"]])
+        else:
+            vectors.append(new_embeds[offset])
+            offset += 1
+    return np.vstack(vectors).astype(np.float32), fresh
+
+
+def stream_ingest(
+    topic: str,
+    days: int,
+    limit: int = 60,
+    page_size: int = ARXIV_PAGE_SIZE,
+    until: Optional[dt.date] = None,
+    priority: Optional[str] = None,
+    deduper: Optional[PaperDeduper] = None,
+) -> Iterator[Tuple[List[Dict[str, Any]], np.ndarray]]:
+    """
+    Three-stage ingestion that overlaps network, CPU and disk:
+
+    - a fetch thread pulls arXiv pages into a bounded queue (INGEST_QUEUE_PAGES deep),
+    - the calling thread dedups each page, reuses cached vectors and encodes the rest,
+      yielding (papers, embeddings) per page,
+    - a writer thread persists papers to SQLite and new vectors to Chroma in batches of
+      INGEST_WRITE_BATCH papers.
+
+    The fetch thread uses `priority`, defaulting to the caller's request_priority lane (context
+    variables do not follow plain threads). Fetch and write errors are re-raised in the caller once
+    the stream is drained.
+    """
+    priority = priority or current_priority()
+    deduper = deduper or PaperDeduper()
+    pages: "queue.Queue[Any]" = queue.Queue(maxsize=INGEST_QUEUE_PAGES)
+    writes: "queue.Queue[Any]" = queue.Queue(maxsize=INGEST_QUEUE_PAGES)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+
+    def _put_page(item: Any) -> bool:
+        # Give up if the consumer has gone away, so the fetch thread never blocks forever.
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fetch() -> None:
+        try:
+            with request_priority(priority):
+                for page in chunked(iter_arxiv(topic, days, limit, page_size=page_size, until=until), page_size):
+                    if not _put_page(page):
+                        return
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            _put_page(_DONE)
+
+    def _write() -> None:
+        papers: List[Dict[str, Any]] = []
+        fresh_papers: List[Dict[str, Any]] = []
+        fresh_vectors: List[np.ndarray] = []
+
+        def _flush() -> None:
+            try:
+                if papers:
+                    upsert_papers(papers)
+                if fresh_papers:
+                    upsert_chroma(fresh_papers, np.vstack(fresh_vectors))
+            except Exception as exc:
+                errors.append(exc)
+            papers.clear()
+            fresh_papers.clear()
+            fresh_vectors.clear()
+
+        # Keep draining even after a failed flush so the embed stage never blocks on a full queue.
+        while True:
+            item = writes.get()
+            if item is _DONE:
+                break
+            kept, fresh, vectors = item
+            papers.extend(kept)
+            fresh_papers.extend(fresh)
+            fresh_vectors.extend(vectors)
+            if len(papers) >= INGEST_WRITE_BATCH:
+                _flush()
+        _flush()
+
+    fetcher = threading.Thread(target=_fetch, name="ingest-fetch", daemon=True)
+    writer = threading.Thread(target=_write, name="ingest-write", daemon=True)
+    fetcher.start()
+    writer.start()
+    try:
+        while True:
+            page = pages.get()
+            if page is _DONE:
+                break
+            kept = deduper.add_batch(page)
+            if not kept:
+                continue
+            embeds, fresh = _embed_with_cache(kept)
+            writes.put((kept, [kept[i] for i in fresh], [embeds[i] for i in fresh]))
+            yield kept, embeds
+    finally:
+        stop.set()
+        writes.put(_DONE)
+        writer.join()
+
+    if errors:
+        raise errors[0]
+
+
+def ingest_papers(
+    topic: str,
+    days: int,
+    limit: int = 60,
+    until: Optional[dt.date] = None,
+    priority: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """
+    Collect stream_ingest into (papers, embeddings). Concurrent identical requests share one run,
+    fetched in the lane of whichever caller started it.
+    """
+    priority = priority or current_priority()
+
+    def _run() -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        papers: List[Dict[str, Any]] = []
+        chunks: List[np.ndarray] = []
+        for kept, embeds in stream_ingest(topic, days, limit, until=until, priority=priority):
+            papers.extend(kept)
+            chunks.append(embeds)
+        embeds = np.vstack(chunks) if chunks else np.empty((0, 0), dtype=np.float32)
+        return papers, embeds
+
+    papers, embeds = dedupe_inflight(("ingest", topic, days, limit, until), _run)
+    return list(papers), embeds
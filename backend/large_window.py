@@ -0,0 +1,132 @@
+import heapq
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+from artifacts import large_window_key, load_artifact, store_artifact
+from db import get_papers_by_ids
+from dedup import PaperDeduper
+from ingest import chunked, stream_ingest
+from services import embed_texts, lookup_embeddings
+
+LARGE_WINDOW_LIMIT = max(1, int(os.getenv("LARGE_WINDOW_LIMIT", "2000")))
+LARGE_WINDOW_PAGE_SIZE = max(1, int(os.getenv("LARGE_WINDOW_PAGE_SIZE", "200")))
+LARGE_WINDOW_CLUSTERS = max(1, int(os.getenv("LARGE_WINDOW_CLUSTERS", "12")))
+EMBED_CHUNK_SIZE = max(16, int(os.getenv("EMBED_CHUNK_SIZE", "256")))
+REPRESENTATIVES_PER_CLUSTER = 3
+
+
+def _load_vectors(ids: List[str]) -> np.ndarray:
+    """
+    Read one chunk of embeddings back from Chroma (in ids order), re-embedding from the SQLite
+    abstracts anything the vector store does not return.
+    """
+    found = lookup_embeddings(ids)
+    missing = [pid for pid in ids if pid not in found]
+    if missing:
+        rows = {r["id"]: r for r in get_papers_by_ids(missing)}
+        texts = [rows[pid]["abstract"] if pid in rows else "" for pid in missing]
+        for pid, vec in zip(missing, embed_texts(texts)):
+            found[pid] = vec
+    return np.vstack([found[pid] for pid in ids]).astype(np.float32)
+
+
+def _new_kmeans(k: int) -> MiniBatchKMeans:
+    return MiniBatchKMeans(n_clusters=k, random_state=42, batch_size=EMBED_CHUNK_SIZE, n_init=3)
+
+
+def ingest_large_window(
+    topic: str,
+    days: int,
+    limit: int = LARGE_WINDOW_LIMIT,
+    k: int = LARGE_WINDOW_CLUSTERS,
+) -> Dict[str, Any]:
+    """
+    Stream up to `limit` papers through the pipelined ingest (dedup -> embedding per page, persisted
+    to Chroma/SQLite behind it) into MiniBatchKMeans.partial_fit, then make a second chunked pass to
+    assign clusters and keep only the REPRESENTATIVES_PER_CLUSTER papers closest to each centre.
+
+    Only paper ids and dedup signatures grow with the window; vectors and paper bodies are held
+    one chunk at a time.
+    """
+    deduper = PaperDeduper()
+    kmeans = _new_kmeans(k)
+    ids: List[str] = []
+    warmup: Optional[np.ndarray] = None
+    fitted = False
+
+    for papers, embeds in stream_ingest(topic, days, limit, page_size=LARGE_WINDOW_PAGE_SIZE, deduper=deduper):
+        ids.extend(p["id"] for p in papers)
+
+        if fitted:
+            kmeans.partial_fit(embeds)
+            continue
+        # The first partial_fit needs at least k samples to initialise the centres.
+        warmup = embeds if warmup is None else np.vstack([warmup, embeds])
+        if len(warmup) >= k:
+            kmeans.partial_fit(warmup)
+            warmup = None
+            fitted = True
+
+    if not ids:
+        return {"paper_count": 0, "sizes": {}, "payload": [], "papers": []}
+    if not fitted:
+        kmeans = _new_kmeans(len(warmup)).fit(warmup)
+
+    # Second pass: assign every paper, keeping a bounded max-heap of the nearest papers per cluster.
+    centers = kmeans.cluster_centers_
+    sizes: Dict[int, int] = {}
+    nearest: Dict[int, List[tuple]] = {}
+    for id_chunk in chunked(ids, EMBED_CHUNK_SIZE):
+        vecs = _load_vectors(id_chunk)
+        labels = kmeans.predict(vecs)
+        dists = np.linalg.norm(vecs - centers[labels], axis=1)
+        for pid, cid, dist in zip(id_chunk, labels.tolist(), dists.tolist()):
+            sizes[cid] = sizes.get(cid, 0) + 1
+            heap = nearest.setdefault(cid, [])
+            if len(heap) < REPRESENTATIVES_PER_CLUSTER:
+                heapq.heappush(heap, (-dist, pid))
+            elif -heap[0][0] > dist:
+                heapq.heapreplace(heap, (-dist, pid))
+
+    rep_ids = [pid for heap in nearest.values() for _, pid in heap]
+    rows = {r["id"]: r for r in get_papers_by_ids(rep_ids)}
+    payload = []
+    for cid in sorted(nearest):
+        reps = [pid for _, pid in sorted(nearest[cid], key=lambda x: -x[0]) if pid in rows]
+        payload.append({
+            "cluster_id": int(cid),
+            "papers": [
+                {
+                    "title": rows[pid]["title"],
+                    "abstract": rows[pid]["abstract"],
+                    "url": rows[pid]["url"],
+                    "id": pid,
+                }
+                for pid in reps
+            ],
+        })
+
+    return {
+        "paper_count": len(ids),
+        "sizes": {str(cid): n for cid, n in sorted(sizes.items())},
+        "payload": payload,
+        "papers": [rows[pid] for pid in rep_ids if pid in rows],
+    }
+
+
+def load_large_window_clusters(topic: str, days: int, ttl_hours: int) -> Dict[str, Any]:
+    """
+    Cached wrapper around ingest_large_window; `papers` holds only the cluster representatives.
+    """
+    key = large_window_key(topic, days, LARGE_WINDOW_LIMIT, LARGE_WINDOW_CLUSTERS)
+    cached = load_artifact(key, ttl_hours)
+    if cached is not None:
+        return cached
+
+    clusters = ingest_large_window(topic, days)
+    if clusters["paper_count"]:
+        store_artifact(key, "large_window", clusters)
+    return clusters
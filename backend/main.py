@@ -1,23 +1,29 @@
-import os, json
-from typing import Literal
-from fastapi import FastAPI, HTTPException, Query
+import os, json, zlib
+import datetime as dt
+from typing import Any, Callable, Dict, Iterator, Literal, Optional
+from fastapi import BackgroundTasks, Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from fastapi.middleware.cors import CORSMiddleware
 from prompts import CLUSTER_PROMPT, DIGEST_PROMPT, MONTHLY_DIGEST_PROMPT
 from services import (
     fetch_arxiv,
-    fetch_or_create_embeddings,
-    cluster_embeddings,
-    clusters_to_payload,
-    label_clusters_with_claude,
     compose_digest,
     maybe_tts_fish_audio,
     enrich_top_papers,
     select_top_papers
 )
-from db import upsert_papers
+from pipeline import load_papers, load_clusters, load_labeled_clusters
+from large_window import load_large_window_clusters
+from rollup import build_monthly_rollup
 from cache import save_digest, get_latest_digest, get_cached_digest
 from digest_ids import build_digest_id
+from db import iter_papers, iter_digests
+from admission import Overloaded, cache_gate, fast_gate, pipeline_gate, upgrade_gate
+from fast_digest import label_clusters_locally, render_fast_digest, select_centroid_top_papers
+import metrics
+import profiling
+from arxiv_client import PRIORITY_BACKGROUND, request_priority
 
 app = FastAPI(title="Kensa API")
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
@@ -30,11 +36,35 @@ class DigestReq(BaseModel):
   voice: bool = False
   top_k: int = Field(default=3, ge=4, le=6, alias="topK")
   period: Literal["weekly", "monthly"] = "weekly"
+  large_window: bool = Field(default=False, alias="largeWindow")
+  rollup: bool = False
+  mode: Literal["full", "fast"] = "full"
+  upgrade: bool = False
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": f"Server busy ({exc.gate}); retry later"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 @app.get("/api/health")
 def health():
     return {"ok": True}
 
+@app.get("/api/metrics")
+def get_metrics():
+    return {
+        **metrics.snapshot(),
+        "admission": {
+            "cache": cache_gate.snapshot(),
+            "fast": fast_gate.snapshot(),
+            "pipeline": pipeline_gate.snapshot(),
+            "upgrade": upgrade_gate.snapshot(),
+        },
+    }
+
 @app.get("/api/papers")
 def papers(topic: str = Query(..., min_length=2), days: int = Query(7, ge=1, le=30), limit: int = Query(10, ge=1, le=25)):
     rows = fetch_arxiv(topic, days, limit=limit)
@@ -42,6 +72,57 @@ def papers(topic: str = Query(..., min_length=2), days: int = Query(7, ge=1, le=
         raise HTTPException(status_code=404, detail="No papers found")
     return {"papers": rows[:limit]}
 
+def _ndjson_stream(rows: Iterator[Dict[str, Any]], compress: bool) -> StreamingResponse:
+    def _lines() -> Iterator[bytes]:
+        for row in rows:
+            yield (json.dumps(row, ensure_ascii=False) + "\n").encode()
+
+    def _gzipped() -> Iterator[bytes]:
+        # wbits=31 -> gzip container. Compressed bytes go out as zlib emits them; memory is bounded by
+        # the compressor window, and the only flush is the final one.
+        encoder = zlib.compressobj(wbits=31)
+        for line in _lines():
+            chunk = encoder.compress(line)
+            if chunk:
+                yield chunk
+        yield encoder.flush()
+
+    headers = {"Content-Encoding": "gzip"} if compress else {}
+    return StreamingResponse(_gzipped() if compress else _lines(), media_type="application/x-ndjson", headers=headers)
+
+def _export_bounds(since: Optional[dt.date], until: Optional[dt.date]) -> tuple:
+    # `until` is inclusive for callers; the keyset query wants an exclusive upper bound.
+    return (
+        since.isoformat() if since else None,
+        (until + dt.timedelta(days=1)).isoformat() if until else None,
+    )
+
+@app.get("/api/export/papers")
+def export_papers(
+    since: Optional[dt.date] = None,
+    until: Optional[dt.date] = None,
+    compress: bool = Query(False, alias="gzip"),
+):
+    lower, upper = _export_bounds(since, until)
+    return _ndjson_stream(iter_papers(lower, upper), compress)
+
+@app.get("/api/export/digests")
+def export_digests(
+    since: Optional[dt.date] = None,
+    until: Optional[dt.date] = None,
+    compress: bool = Query(False, alias="gzip"),
+):
+    lower, upper = _export_bounds(since, until)
+
+    def _rows() -> Iterator[Dict[str, Any]]:
+        for row in iter_digests(lower, upper):
+            clusters_json = row.pop("clusters_json", None) or "[]"
+            row["clusters"] = json.loads(clusters_json)
+            row["voice"] = bool(row.get("voice"))
+            yield row
+
+    return _ndjson_stream(_rows(), compress)
+
 @app.get("/api/digest/latest")
 def latest(
     topic: str = Query(..., min_length=2),
@@ -57,47 +138,157 @@ def latest(
         "audioUrl": row["audio_url"]
     }
 
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not profiling.is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.get("/api/admin/profiles", dependencies=[Depends(require_admin)])
+def list_profiles():
+    return {"profiles": profiling.list_profiles()}
+
+@app.get("/api/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def download_profile(profile_id: str):
+    profile = profiling.get_profile(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(
+        profile["collapsed"],
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'},
+    )
+
 @app.post("/api/digest")
-def digest(req: DigestReq):
+async def digest(
+    req: DigestReq,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None),
+):
+    # Cache reads and full pipeline runs are admitted through separate gates, so a storm of
+    # misses queues (or gets a 429) without starving cache hits or the default threadpool.
     topic = req.topic.strip()
     period_days = req.days
     if req.period == "monthly":
         period_days = max(req.days, 28)
+    use_rollup = req.rollup and req.period == "monthly"
+    if req.mode == "fast" and (use_rollup or req.large_window):
+        # The fast path only knows the sampled paper set; it cannot stand in for these digests.
+        raise HTTPException(status_code=400, detail="mode=fast does not support largeWindow or rollup")
+    # Roll-up and large-window digests are cached separately from the regular sampled ones.
+    cache_period = req.period
+    if use_rollup:
+        cache_period = f"{req.period}:rollup"
+    elif req.large_window:
+        cache_period = f"{req.period}:large"
 
-    cached = get_cached_digest(
-        topic,
-        period_days,
-        req.top_k,
-        req.period,
-        req.voice,
-        DEFAULT_CACHE_TTL
-    )
-    if cached:
-        return {
-            "digestId": cached["id"],
-            "summary": cached["summary"],
-            "clusters": json.loads(cached["clusters_json"]),
-            "audioUrl": cached["audio_url"],
-            "days": period_days,
-            "period": req.period,
-            "topK": req.top_k
-        }
-
-    papers = fetch_arxiv(topic, period_days)
+    # Profiling is decided once and covers every path (cache hit, fast, full): each stage samples
+    # the gate thread it runs on into the same profile.
+    profile = None
+    if profiling.should_profile(x_profile, x_admin_token):
+        profile = profiling.RequestProfile(f"digest:{topic}:{period_days}:{req.mode}")
+        response.headers["X-Profile-Id"] = profile.id
+    try:
+        cached = await cache_gate.run(_traced(profile, _cached_digest), req, topic, period_days, cache_period)
+        if cached:
+            return cached
+
+        if req.mode == "fast":
+            result = await fast_gate.run(_traced(profile, _fast_digest), req, topic, period_days)
+            if req.upgrade:
+                background_tasks.add_task(_upgrade_digest, req, topic, period_days, cache_period, use_rollup)
+                result["upgradePending"] = True
+            return result
+
+        return await pipeline_gate.run(
+            _traced(profile, _generate_digest), req, topic, period_days, cache_period, use_rollup
+        )
+    finally:
+        if profile is not None:
+            profile.finish()
+
+def _traced(profile: Optional[profiling.RequestProfile], fn: Callable[..., Any]) -> Callable[..., Any]:
+    if profile is None:
+        return fn
+
+    def _run(*args: Any) -> Any:
+        with profile.track():
+            return fn(*args)
+    return _run
+
+def _cached_digest(req: DigestReq, topic: str, period_days: int, cache_period: str):
+    cached = get_cached_digest(topic, period_days, req.top_k, cache_period, req.voice, DEFAULT_CACHE_TTL)
+    if not cached:
+        return None
+    return {
+        "digestId": cached["id"],
+        "summary": cached["summary"],
+        "clusters": json.loads(cached["clusters_json"]),
+        "audioUrl": cached["audio_url"],
+        "days": period_days,
+        "period": req.period,
+        "topK": req.top_k
+    }
+
+def _fast_digest(req: DigestReq, topic: str, period_days: int):
+    """
+    LLM-free digest: c-TF-IDF cluster labels, centroid-ranked top papers and a markdown template.
+    Not saved to the digest cache, so it never shadows the LLM-written version.
+    """
+    papers, embeds = load_papers(topic, period_days, DEFAULT_CACHE_TTL)
     if not papers:
         raise HTTPException(status_code=404, detail="No papers found")
-    upsert_papers(papers)
 
-    embeds = fetch_or_create_embeddings(papers)
+    clusters = load_clusters(papers, embeds=embeds)
+    labeled = label_clusters_locally(papers, clusters)
+    top_papers = select_centroid_top_papers(labeled, papers, req.top_k)
+    summary = render_fast_digest(req.topic, period_days, req.period, labeled, top_papers)
+    return {
+        "digestId": build_digest_id(topic, period_days),
+        "summary": summary,
+        "clusters": labeled,
+        "audioUrl": None,
+        "days": period_days,
+        "period": req.period,
+        "topK": req.top_k,
+        "mode": "fast"
+    }
+
+async def _upgrade_digest(req: DigestReq, topic: str, period_days: int, cache_period: str, use_rollup: bool):
+    # Best effort: the full digest lands in the cache for the next request; shed it under load.
+    try:
+        await upgrade_gate.run(_background_digest, req, topic, period_days, cache_period, use_rollup)
+    except Exception:
+        metrics.incr("digest.upgrade_failed")
+
+def _background_digest(*args: Any):
+    # Set on the worker thread itself so the arXiv fetches queue behind interactive requests.
+    with request_priority(PRIORITY_BACKGROUND):
+        return _generate_digest(*args)
 
-    labels, _ = cluster_embeddings(embeds, k=6)
-    payload = clusters_to_payload(papers, embeds, labels)
+def _generate_digest(req: DigestReq, topic: str, period_days: int, cache_period: str, use_rollup: bool):
+    if use_rollup:
+        # Reduce over the stored weekly clusters: one LLM call once the weeks are cached.
+        summary, labeled = build_monthly_rollup(topic, period_days, req.top_k, DEFAULT_CACHE_TTL)
+        if not labeled:
+            raise HTTPException(status_code=404, detail="No papers found")
+    else:
+        # Each stage is cached on its own inputs, so topK/voice/period variants only rerun
+        # top-paper selection, composition and TTS.
+        if req.large_window:
+            # Only cluster representatives come back, so `papers` stays small however wide the window.
+            clusters = load_large_window_clusters(topic, period_days, DEFAULT_CACHE_TTL)
+            papers = clusters["papers"]
+        else:
+            papers, embeds = load_papers(topic, period_days, DEFAULT_CACHE_TTL)
+            clusters = load_clusters(papers, embeds=embeds) if papers else None
+        if not papers:
+            raise HTTPException(status_code=404, detail="No papers found")
 
-    labeled = label_clusters_with_claude(payload, CLUSTER_PROMPT)
-    labeled = enrich_top_papers(labeled or [], papers)
-    top_papers = select_top_papers(labeled, papers, req.top_k)
-    prompt_template = MONTHLY_DIGEST_PROMPT if req.period == "monthly" else DIGEST_PROMPT
-    summary = compose_digest(req.topic, period_days, req.top_k, labeled, prompt_template, top_papers)
+        labeled = load_labeled_clusters(clusters["payload"], CLUSTER_PROMPT)
+        labeled = enrich_top_papers(labeled or [], papers)
+        top_papers = select_top_papers(labeled, papers, req.top_k)
+        prompt_template = MONTHLY_DIGEST_PROMPT if req.period == "monthly" else DIGEST_PROMPT
+        summary = compose_digest(req.topic, period_days, req.top_k, labeled, prompt_template, top_papers)
 
     audio_url = maybe_tts_fish_audio(summary) if req.voice else None
 
@@ -110,7 +301,7 @@ def digest(req: DigestReq):
         json.dumps(labeled, ensure_ascii=False),
         audio_url,
         req.top_k,
-        req.period,
+        cache_period,
         req.voice
     )
 
@@ -0,0 +1,79 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from artifacts import (
+    clusters_key,
+    labels_key,
+    load_artifact,
+    papers_key,
+    store_artifact,
+)
+from ingest import ingest_papers
+from services import (
+    fetch_or_create_embeddings,
+    cluster_embeddings,
+    clusters_to_payload,
+    label_clusters_with_claude,
+)
+
+DEFAULT_CLUSTER_COUNT = 6
+
+
+def load_papers(topic: str, days: int, ttl_hours: int) -> Tuple[List[Dict[str, Any]], Optional[np.ndarray]]:
+    """
+    Paper set for (topic, days), with arXiv versions and near-duplicates collapsed before anything
+    is embedded. Re-uses the stored set while it is within the TTL window.
+
+    Returns (papers, embeddings). On a miss the pipelined ingest embeds pages while later ones are
+    still downloading, so the vectors come back too; on a hit embeddings is None.
+    """
+    key = papers_key(topic, days)
+    cached = load_artifact(key, ttl_hours)
+    if cached is not None:
+        return cached, None
+
+    papers, embeds = ingest_papers(topic, days)
+    if papers:
+        store_artifact(key, "papers", papers)
+    return papers, embeds
+
+
+def load_clusters(
+    papers: List[Dict[str, Any]],
+    k: int = DEFAULT_CLUSTER_COUNT,
+    embeds: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    Cluster assignment ({paper_id: cluster_id}) plus the representative payload sent to the labeler.
+    Keyed by the paper ids and versions, so embeddings are only fetched when the paper set actually changed.
+    """
+    key = clusters_key(papers, k)
+    cached = load_artifact(key)
+    if cached is not None:
+        return cached
+
+    if embeds is None:
+        embeds = fetch_or_create_embeddings(papers)
+    labels, _ = cluster_embeddings(embeds, k=k)
+    clusters = {
+        "assignments": {p["id"]: int(cid) for p, cid in zip(papers, np.asarray(labels).tolist())},
+        "payload": clusters_to_payload(papers, embeds, labels),
+    }
+    store_artifact(key, "clusters", clusters)
+    return clusters
+
+
+def load_labeled_clusters(cluster_payload: List[Dict[str, Any]], cluster_prompt: str) -> List[Dict[str, Any]]:
+    """
+    LLM labels for a cluster payload. Empty results (malformed responses) are not cached.
+    """
+    key = labels_key(cluster_payload, cluster_prompt)
+    cached = load_artifact(key)
+    if cached is not None:
+        return cached
+
+    labeled = label_clusters_with_claude(cluster_payload, cluster_prompt)
+    if labeled:
+        store_artifact(key, "labels", labeled)
+    return labeled
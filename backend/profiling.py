@@ -0,0 +1,133 @@
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_SECONDS = max(0.001, float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000)
+PROFILE_MAX_STORED = max(1, int(os.getenv("PROFILE_MAX_STORED", "50")))
+
+_profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_profiles_lock = threading.Lock()
+_TRUTHY = {"1", "true", "yes", "on"}
+
+
+def is_admin(token: Optional[str]) -> bool:
+    if not PROFILE_ADMIN_TOKEN or token is None:
+        return False
+    # Constant-time comparison so response timing does not leak the token prefix.
+    return hmac.compare_digest(token.encode(), PROFILE_ADMIN_TOKEN.encode())
+
+
+def should_profile(profile_header: Optional[str], admin_token: Optional[str]) -> bool:
+    """
+    Explicit opt-in (a truthy X-Profile header with a valid admin token) or random sampling at
+    PROFILE_SAMPLE_RATE. Both checks are free when profiling is off.
+    """
+    opted_in = (profile_header or "").strip().lower() in _TRUTHY
+    if opted_in and is_admin(admin_token):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _collapsed(samples: Counter) -> str:
+    """Brendan Gregg's collapsed format, ready for flamegraph.pl / speedscope."""
+    return "\n".join(f"{stack} {count}" for stack, count in samples.most_common())
+
+
+class StackSampler:
+    """
+    Wall-clock sampling profiler for a single thread: a daemon thread reads the target's current
+    frame every interval and counts collapsed stacks. The profiled code runs uninstrumented.
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def _store(profile: Dict[str, Any]) -> None:
+    with _profiles_lock:
+        _profiles[profile["id"]] = profile
+        while len(_profiles) > PROFILE_MAX_STORED:
+            _profiles.popitem(last=False)
+
+
+class RequestProfile:
+    """
+    One profile per request. Each stage runs on whatever gate thread admits it, so stages wrap
+    themselves in track() and their samples are merged here; finish() stores the result.
+    """
+
+    def __init__(self, label: str):
+        self.id = f"prof_{uuid.uuid4().hex[:12]}"
+        self.label = label
+        self.samples: Counter = Counter()
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """Sample the calling thread for the duration of the block."""
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            with self._lock:
+                self.samples.update(sampler.samples)
+
+    def finish(self) -> None:
+        with self._lock:
+            samples = Counter(self.samples)
+        _store({
+            "id": self.id,
+            "label": self.label,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round((time.perf_counter() - self._started) * 1000, 1),
+            "samples": sum(samples.values()),
+            "collapsed": _collapsed(samples),
+        })
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    with _profiles_lock:
+        return [
+            {k: v for k, v in p.items() if k != "collapsed"}
+            for p in reversed(_profiles.values())
+        ]
+
+
+def get_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    with _profiles_lock:
+        return _profiles.get(profile_id)
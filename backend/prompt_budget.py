@@ -0,0 +1,144 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Rough chars-per-token ratio for English prose with Claude's tokenizer; good enough for budgeting.
+CHARS_PER_TOKEN = 4
+LABEL_PROMPT_TOKEN_BUDGET = max(500, int(os.getenv("LABEL_PROMPT_TOKEN_BUDGET", "3000")))
+DIGEST_PROMPT_TOKEN_BUDGET = max(500, int(os.getenv("DIGEST_PROMPT_TOKEN_BUDGET", "3000")))
+ABSTRACT_TOKEN_BUDGET = max(20, int(os.getenv("ABSTRACT_TOKEN_BUDGET", "120")))
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\"'])")
+_WORD_RE = re.compile(r"[a-z][a-z0-9\-]{2,}")
+_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "are", "was", "were", "from", "which", "these",
+    "their", "such", "can", "has", "have", "been", "our", "its", "into", "than", "also", "both",
+    "not", "but", "via", "using", "use", "used", "show", "shows", "paper", "propose", "proposed",
+    "present", "we", "based", "approach", "method", "methods", "results", "new", "well", "however",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def estimate_json_tokens(value: Any) -> int:
+    return estimate_tokens(json.dumps(value, ensure_ascii=False))
+
+
+def _sentences(text: str) -> List[str]:
+    clean = re.sub(r"\s+", " ", text or "").strip()
+    return [s for s in _SENTENCE_RE.split(clean) if s] if clean else []
+
+
+def _normalize_sentence(sentence: str) -> str:
+    return " ".join(_WORD_RE.findall(sentence.lower()))
+
+
+def trim_text(text: str, max_tokens: int, seen: Optional[Set[str]] = None) -> str:
+    """
+    Keep the most informative sentences of text (in their original order) within max_tokens.
+    Sentences are scored by the in-document frequency of their content words; the opening
+    sentence gets a bonus since abstracts usually lead with the contribution. Sentences whose
+    normalized form is already in seen are dropped, and kept ones are added to it.
+    """
+    sentences = _sentences(text)
+    if seen is not None:
+        sentences = [s for s in sentences if _normalize_sentence(s) not in seen]
+    if not sentences:
+        return ""
+
+    words = [[w for w in _WORD_RE.findall(s.lower()) if w not in _STOPWORDS] for s in sentences]
+    freq = Counter(w for ws in words for w in ws)
+    scores = [
+        sum(freq[w] for w in set(ws)) / math.sqrt(len(ws) + 1) + (1.0 if i == 0 else 0.0)
+        for i, ws in enumerate(words)
+    ]
+
+    chosen: List[int] = []
+    used = 0
+    for idx in sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True):
+        cost = estimate_tokens(sentences[idx]) + 1
+        if used + cost > max_tokens:
+            continue
+        chosen.append(idx)
+        used += cost
+
+    if not chosen:
+        # Even the best sentence is over budget: fall back to a hard cut on a word boundary.
+        best = max(range(len(sentences)), key=lambda i: scores[i])
+        chosen = [best]
+        cut = sentences[best][: max_tokens * CHARS_PER_TOKEN].rsplit(" ", 1)[0]
+        sentences[best] = cut + "…"
+
+    if seen is not None:
+        seen.update(_normalize_sentence(sentences[i]) for i in chosen)
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+
+def fit_cluster_payload(
+    cluster_payload: List[Dict[str, Any]],
+    abstract_tokens: int = ABSTRACT_TOKEN_BUDGET,
+) -> List[Dict[str, Any]]:
+    """
+    Copy of the clusters with each abstract trimmed to abstract_tokens and sentences repeated
+    across papers/clusters removed.
+    """
+    seen: Set[str] = set()
+    fitted = []
+    for cluster in cluster_payload:
+        papers = []
+        for paper in cluster.get("papers", []):
+            entry = dict(paper)
+            entry["abstract"] = trim_text(paper.get("abstract", ""), abstract_tokens, seen)
+            papers.append(entry)
+        fitted.append({**cluster, "papers": papers})
+    return fitted
+
+
+def pack_batches(items: List[Any], max_tokens: int, max_items: int) -> List[List[Any]]:
+    """
+    Greedy packing by estimated token count, optionally capped at max_items per batch (0 means no
+    cap). An item larger than max_tokens gets a batch of its own.
+    """
+    batches: List[List[Any]] = []
+    batch: List[Any] = []
+    used = 0
+    for item in items:
+        cost = estimate_json_tokens(item)
+        if batch and (used + cost > max_tokens or 0 < max_items <= len(batch)):
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append(item)
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def fit_digest_payload(
+    top_papers: List[Dict[str, Any]],
+    clusters: List[Dict[str, Any]],
+    max_tokens: int = DIGEST_PROMPT_TOKEN_BUDGET,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Shrink (top_papers, clusters) for the digest prompt until both fit max_tokens: summaries are
+    trimmed progressively, then the trailing clusters are dropped.
+    """
+    def _size(papers: List[Dict[str, Any]], compact: List[Dict[str, Any]]) -> int:
+        return estimate_json_tokens(papers) + estimate_json_tokens(compact)
+
+    papers = [dict(p) for p in top_papers]
+    compact = list(clusters)
+    summary_tokens = ABSTRACT_TOKEN_BUDGET
+    while _size(papers, compact) > max_tokens and summary_tokens >= 20:
+        for paper in papers:
+            if paper.get("summary"):
+                paper["summary"] = trim_text(paper["summary"], summary_tokens)
+        summary_tokens //= 2
+    while _size(papers, compact) > max_tokens and len(compact) > 1:
+        compact = compact[:-1]
+    return papers, compact
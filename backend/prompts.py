@@ -62,3 +62,24 @@ Constraints:
 - Keep tone forward-looking, concise, and suitable for researchers.
 - Return only the specified markdown, with no extra text or metadata.
 """
+
+MONTHLY_ROLLUP_PROMPT = """Write a "Top Papers of the Month" briefing for "{topic}" focused on major advancements from the last {days} days. You are given WEEKLY_CLUSTERS: the cluster summaries already written for each week of the period (oldest weeks may overlap the window edge), plus TOP_PAPERS drawn from them. Merge themes that recur across weeks and note how they evolved. Output ONLY markdown following this exact structure.
+
+Markdown structure (must follow exactly):
+# Monthly Outlook: {topic}
+
+### Breakthrough Snapshot
+- One paragraph (2–4 sentences) summarizing the month's big picture and most significant shift or advance.
+
+### Standout Advances
+- A numbered list ("1. ", "2. ", ...) of up to {top_k} notable papers, ordered by significance.
+- Each item must include the paper title exactly as provided, followed by a single-sentence takeaway (<=25 words) describing the main advance or implication.
+
+### Emerging Directions
+- Three bullets (use "- ") identifying trends, open problems, or promising next steps implied by the weekly clusters and papers (each <=25 words).
+
+Constraints:
+- Use only supplied titles, weekly cluster labels and bullets. Do not hallucinate new papers, results, or citations.
+- Keep tone forward-looking, concise, and suitable for researchers.
+- Return only the specified markdown, with no extra text or metadata.
+"""
@@ -0,0 +1,83 @@
+import datetime as dt
+from typing import Any, Dict, List, Optional, Tuple
+
+from artifacts import WEEK_RETENTION_HOURS, load_artifact, store_artifact, week_key
+from ingest import ingest_papers
+from pipeline import load_clusters, load_labeled_clusters
+from prompts import CLUSTER_PROMPT, MONTHLY_ROLLUP_PROMPT
+from services import (
+    compose_rollup_digest,
+    enrich_top_papers,
+    select_top_papers,
+)
+
+
+def covered_weeks(days: int, today: Optional[dt.date] = None) -> List[Tuple[dt.date, dt.date]]:
+    """
+    Monday-Sunday weeks overlapping the last `days` days, oldest first. Calendar weeks (rather than
+    windows anchored on today) keep the weekly artifacts reusable from one day to the next.
+    """
+    today = today or dt.date.today()
+    first = today - dt.timedelta(days=days)
+    start = first - dt.timedelta(days=first.weekday())
+    weeks = []
+    while start <= today:
+        weeks.append((start, start + dt.timedelta(days=6)))
+        start += dt.timedelta(days=7)
+    return weeks
+
+
+def load_week_clusters(topic: str, week_start: dt.date, week_end: dt.date, ttl_hours: int) -> Dict[str, Any]:
+    """
+    Labeled (and enriched) clusters for one calendar week, generated through the regular staged
+    pipeline when missing. The current week follows the digest TTL; a week snapshotted after it
+    ended is marked complete and kept for WEEK_RETENTION_HOURS, since it can no longer change. A
+    snapshot taken while the week was still open is rebuilt once the week is over, so its last days
+    are not lost.
+    """
+    today = dt.date.today()
+    finished = week_end < today
+    key = week_key(topic, week_start.isoformat())
+    cached = load_artifact(key, WEEK_RETENTION_HOURS if finished else ttl_hours)
+    if cached is not None and (cached.get("complete") or not finished):
+        return cached
+
+    papers, embeds = ingest_papers(topic, (today - week_start).days, until=min(week_end, today))
+    clusters: List[Dict[str, Any]] = []
+    if papers:
+        payload = load_clusters(papers, embeds=embeds)["payload"]
+        clusters = enrich_top_papers(load_labeled_clusters(payload, CLUSTER_PROMPT) or [], papers)
+
+    week = {
+        "week_start": week_start.isoformat(),
+        "week_end": week_end.isoformat(),
+        "paper_count": len(papers),
+        "clusters": clusters,
+        "complete": finished,
+    }
+    # An empty week is only worth remembering if it's over; a labeling failure should be retried.
+    if clusters or (not papers and finished):
+        store_artifact(key, "week", week)
+    return week
+
+
+def build_monthly_rollup(topic: str, days: int, top_k: int, ttl_hours: int) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Monthly digest as a reduce over weekly cluster summaries; returns (summary, clusters), where each
+    cluster is tagged with the week it came from.
+    """
+    weekly = [load_week_clusters(topic, start, end, ttl_hours) for start, end in covered_weeks(days)]
+    weekly = [w for w in weekly if w["clusters"]]
+    if not weekly:
+        return "", []
+
+    # Newest weeks first so the top-paper picks lean towards recent work.
+    clusters = [
+        {**cluster, "week": week["week_start"]}
+        for week in reversed(weekly)
+        for cluster in week["clusters"]
+    ]
+    top_papers = select_top_papers(clusters, [], top_k)
+    # Also newest first for the prompt: if it's over budget, the oldest weeks are dropped.
+    summary = compose_rollup_digest(topic, days, top_k, list(reversed(weekly)), MONTHLY_ROLLUP_PROMPT, top_papers)
+    return summary, clusters
@@ -1,5 +1,5 @@
 import os, json, re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 import arxiv
 from sentence_transformers import SentenceTransformer
 from sklearn.cluster import KMeans
@@ -9,26 +9,79 @@ import datetime as dt
 from dotenv import load_dotenv
 
 from chroma_client import get_collection
+from prompt_budget import (
+    LABEL_PROMPT_TOKEN_BUDGET,
+    estimate_tokens,
+    fit_cluster_payload,
+    fit_digest_payload,
+    pack_batches,
+)
+import metrics
+from arxiv_client import ARXIV_PAGE_SIZE, PRIORITY_INTERACTIVE, dedupe_inflight, get_client, request_priority
 
 load_dotenv()
 CHROMA_PAPERS_COLLECTION = os.getenv("CHROMA_PAPERS_COLLECTION", "papers")
-CLUSTER_BATCH_SIZE = max(1, int(os.getenv("CLUSTER_BATCH_SIZE", "4")))
-LABEL_MAX_TOKENS = max(100, int(os.getenv("LABEL_MAX_TOKENS", "500")))
+# Optional extra cap on clusters per labeling call; 0 (default) leaves it to the token budgets.
+CLUSTER_BATCH_SIZE = max(0, int(os.getenv("CLUSTER_BATCH_SIZE", "0")))
+LABEL_MAX_TOKENS = max(100, int(os.getenv("LABEL_MAX_TOKENS", "700")))
+# Rough size of one cluster's label/bullets/topPapers JSON; bounds clusters per call by LABEL_MAX_TOKENS.
+LABEL_RESPONSE_TOKENS_PER_CLUSTER = max(1, int(os.getenv("LABEL_RESPONSE_TOKENS_PER_CLUSTER", "160")))
+DEFAULT_MAX_TOKENS = 700
 TOP_PAPER_MAX_CHARS = int(os.getenv("TOP_PAPER_MAX_CHARS", "420"))
 
-def fetch_arxiv(topic: str, days: int = 7, limit: int = 60) -> List[Dict[str, Any]]:
-    # Build the search; we'll filter by date ourselves
+def fetch_arxiv(
+    topic: str,
+    days: int = 7,
+    limit: int = 60,
+    priority: str = PRIORITY_INTERACTIVE,
+    until: Optional[dt.date] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Fetch recent papers through the shared rate-limited arXiv client. Identical concurrent
+    queries share a single fetch.
+    """
+    papers = dedupe_inflight(
+        ("fetch_arxiv", topic, days, limit, until),
+        lambda: _fetch_arxiv(topic, days, limit, priority, until),
+    )
+    return list(papers)
+
+
+def _fetch_arxiv(topic: str, days: int, limit: int, priority: str, until: Optional[dt.date]) -> List[Dict[str, Any]]:
+    with request_priority(priority):
+        return list(iter_arxiv(topic, days, limit, until=until))
+
+
+def iter_arxiv(
+    topic: str,
+    days: int = 7,
+    limit: int = 60,
+    page_size: Optional[int] = None,
+    until: Optional[dt.date] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield papers one at a time as pages arrive. Consume it under arxiv_client.request_priority
+    to pick the rate-limiter lane (defaults to interactive).
+
+    The date window goes into the query (submittedDate range), so arXiv stops paging at the
+    cutoff instead of us discarding older results. With `until`, the window ends there instead
+    of today, so past weeks can be fetched on their own.
+    """
+    cutoff = dt.date.today() - dt.timedelta(days=days)
+    end = until or dt.date.today()
+    query = f"({topic}) AND submittedDate:[{cutoff:%Y%m%d}0000 TO {end:%Y%m%d}2359]"
+
+    # Build the search; the date check below still applies to revised papers (updated date)
     search = arxiv.Search(
-        query=topic,
+        query=query,
         max_results=limit,  # library still paginates under the hood
         sort_by=arxiv.SortCriterion.SubmittedDate,
     )
 
-    # More resilient client: smaller pages + retries + polite delay
-    client = arxiv.Client(page_size=25, delay_seconds=1, num_retries=3)
+    # Shared client: pages are paced by the process-wide token bucket, not per request
+    client = get_client(page_size or ARXIV_PAGE_SIZE)
 
-    cutoff = dt.date.today() - dt.timedelta(days=days)
-    papers: List[Dict[str, Any]] = []
+    count = 0
 
     try:
         for r in client.results(search):
@@ -37,27 +90,26 @@ def fetch_arxiv(topic: str, days: int = 7, limit: int = 60) -> List[Dict[str, An
             if pub_date < cutoff:
                 continue
 
-            papers.append({
+            yield {
                 "id": r.get_short_id(),
                 "title": r.title,
                 "abstract": r.summary,
                 "url": r.entry_id,
                 "published_at": pub_date.isoformat(),
                 "authors": ", ".join(a.name for a in getattr(r, "authors", []) if getattr(a, "name", None)),
-            })
+            }
 
-            if len(papers) >= limit:
-                break
+            count += 1
+            if count >= limit:
+                return
 
     except arxiv.UnexpectedEmptyPageError:
         # arXiv served an empty page mid-iteration; return what we have
-        pass
+        return
     except Exception as e:
         # Surface other issues (network, rate limits) as a 500 you can see
         raise RuntimeError(f"arXiv fetch failed: {e}")
 
-    return papers
-
 
 def get_papers_collection():
     return get_collection(CHROMA_PAPERS_COLLECTION)
@@ -69,27 +121,41 @@ def embed_texts(texts: List[str]) -> np.ndarray:
         _embed_model = SentenceTransformer("all-MiniLM-L6-v2")
     return np.asarray(_embed_model.encode(texts), dtype=np.float32)
 
-def fetch_or_create_embeddings(papers: List[Dict[str, Any]]) -> np.ndarray:
+def lookup_embeddings(ids: List[str], min_versions: Optional[Dict[str, int]] = None) -> Dict[str, np.ndarray]:
     """
-    Return embeddings for the provided papers, re-using any vectors already persisted in Chroma.
+    Vectors already persisted in Chroma for the given paper ids; empty if Chroma is unavailable.
+    With min_versions ({id: arXiv version}), vectors stored for an older version are treated as
+    missing so the revised abstract gets re-embedded.
     """
-    if not papers:
-        return np.empty((0, 0), dtype=np.float32)
-
-    col = get_papers_collection()
-    ids = [p["id"] for p in papers]
-    existing_map: Dict[str, np.ndarray] = {}
-
+    found: Dict[str, np.ndarray] = {}
     try:
-        existing = col.get(ids=ids, include=["embeddings"])
+        existing = get_papers_collection().get(ids=ids, include=["embeddings", "metadatas"])
         if existing and existing.get("ids"):
+            embeds = existing.get("embeddings")
+            embeds = [] if embeds is None else embeds
+            metadatas = existing.get("metadatas") or []
             for idx, pid in enumerate(existing["ids"]):
-                embeds = existing.get("embeddings") or []
+                metadata = (metadatas[idx] if idx < len(metadatas) else None) or {}
+                if min_versions and metadata.get("version", 1) < min_versions.get(pid, 1):
+                    continue
                 if idx < len(embeds) and embeds[idx] is not None:
-                    existing_map[pid] = np.asarray(embeds[idx], dtype=np.float32)
+                    found[pid] = np.asarray(embeds[idx], dtype=np.float32)
     except Exception:
         # If Chroma is unavailable, fall back to re-embedding everything.
-        existing_map = {}
+        return {}
+    return found
+
+def fetch_or_create_embeddings(papers: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Return embeddings for the provided papers, re-using any vectors already persisted in Chroma.
+    """
+    if not papers:
+        return np.empty((0, 0), dtype=np.float32)
+
+    existing_map = lookup_embeddings(
+        [p["id"] for p in papers],
+        {p["id"]: p.get("version", 1) for p in papers},
+    )
 
     embeddings: List[Optional[np.ndarray]] = [None] * len(papers)
     new_indices: List[int] = []
@@ -115,29 +181,38 @@ def fetch_or_create_embeddings(papers: List[Dict[str, Any]]) -> np.ndarray:
     return np.vstack(embeddings).astype(np.float32)
 
 def upsert_chroma(papers: List[Dict[str, Any]], embeds: np.ndarray) -> None:
+    """
+    Store vectors for papers that are new to Chroma, or whose arXiv version is newer than the
+    stored one (the abstract may have been revised).
+    """
     col = get_papers_collection()
     ids = [p["id"] for p in papers]
-    existing_ids = set()
+    stored_versions: Dict[str, int] = {}
     try:
-        existing = col.get(ids=ids)
+        existing = col.get(ids=ids, include=["metadatas"])
         if existing and existing.get("ids"):
-            existing_ids.update(existing["ids"])
+            metadatas = existing.get("metadatas") or []
+            for idx, pid in enumerate(existing["ids"]):
+                metadata = (metadatas[idx] if idx < len(metadatas) else None) or {}
+                stored_versions[pid] = metadata.get("version", 1)
     except Exception:
-        existing_ids = set()
+        stored_versions = {}
 
-    to_store = [
-        (idx, paper_id)
+    indices = [
+        idx
         for idx, paper_id in enumerate(ids)
-        if paper_id not in existing_ids
+        if paper_id not in stored_versions or papers[idx].get("version", 1) > stored_versions[paper_id]
     ]
-    if not to_store:
+    if not indices:
         return
-    indices = [idx for idx, _ in to_store]
     col.upsert(
         ids=[ids[idx] for idx in indices],
         documents=[papers[idx]["abstract"] for idx in indices],
         embeddings=[embeds[idx].tolist() for idx in indices],
-        metadatas=[{"title": papers[idx]["title"], "url": papers[idx]["url"]} for idx in indices]
+        metadatas=[
+            {"title": papers[idx]["title"], "url": papers[idx]["url"], "version": papers[idx].get("version", 1)}
+            for idx in indices
+        ]
     )
 
 def cluster_embeddings(embeds: np.ndarray, k: int = 6):
@@ -176,7 +251,12 @@ def clusters_to_payload(papers: List[Dict[str, Any]], embeds: np.ndarray, labels
         })
     return payload
 
-def call_claude(prompt: str, system: str = "You are a concise academic editor.", max_tokens: Optional[int] = None) -> str:
+def call_claude(
+    prompt: str,
+    system: str = "You are a concise academic editor.",
+    max_tokens: Optional[int] = None,
+    purpose: str = "generic",
+) -> str:
     lava_token = os.getenv("LAVA_FORWARD_TOKEN")
     lava_base = os.getenv("LAVA_BASE_URL", "https://api.lavapayments.com/v1")
     
@@ -194,7 +274,7 @@ def call_claude(prompt: str, system: str = "You are a concise academic editor.",
     
     payload = {
         "model": "claude-haiku-4-5-20251001",
-        "max_tokens": 700,
+        "max_tokens": max_tokens or DEFAULT_MAX_TOKENS,
         "temperature": 0.4,
         "system": system,
         "stop_sequences": ["### END"],
@@ -211,18 +291,25 @@ def call_claude(prompt: str, system: str = "You are a concise academic editor.",
         raise RuntimeError(f"Lava/Anthropic API error: {response.text}")
     
     data = response.json()
-    return data["content"][0]["text"] if data.get("content") else ""
+    text = data["content"][0]["text"] if data.get("content") else ""
+
+    # Prefer the API's own usage numbers; fall back to estimates if the proxy strips them.
+    usage = data.get("usage") or {}
+    prompt_tokens = usage.get("input_tokens") or estimate_tokens(system) + estimate_tokens(prompt)
+    response_tokens = usage.get("output_tokens") or estimate_tokens(text)
+    metrics.observe(f"llm.prompt_tokens.{purpose}", prompt_tokens)
+    metrics.observe(f"llm.response_tokens.{purpose}", response_tokens)
+    return text
 
 def label_clusters_with_claude(cluster_payload: List[Dict[str, Any]], cluster_prompt: str) -> List[Dict[str, Any]]:
     out: List[Dict[str, Any]] = []
-    batch: List[Dict[str, Any]] = []
     import json as _json
 
     def _send(payload: List[Dict[str, Any]]) -> None:
         if not payload:
             return
         text = _json.dumps(payload, ensure_ascii=False)
-        raw = call_claude(f"{cluster_prompt}\n\nCLUSTERS:\n{text}", max_tokens=LABEL_MAX_TOKENS)
+        raw = call_claude(f"{cluster_prompt}\n\nCLUSTERS:\n{text}", max_tokens=LABEL_MAX_TOKENS, purpose="label")
         try:
             arr = _json.loads(raw)
             if isinstance(arr, list):
@@ -231,12 +318,14 @@ def label_clusters_with_claude(cluster_payload: List[Dict[str, Any]], cluster_pr
             # If Claude returns malformed JSON, skip this batch; caller can decide how to handle empty clusters.
             pass
 
-    for cluster in cluster_payload:
-        batch.append(cluster)
-        if len(batch) >= CLUSTER_BATCH_SIZE:
-            _send(batch)
-            batch = []
-    if batch:
+    # Batches are packed by estimated prompt tokens and capped so the JSON answer fits LABEL_MAX_TOKENS
+    # (a truncated answer fails to parse and loses the whole batch); CLUSTER_BATCH_SIZE can lower it further.
+    fitted = fit_cluster_payload(cluster_payload)
+    budget = max(1, LABEL_PROMPT_TOKEN_BUDGET - estimate_tokens(cluster_prompt))
+    max_clusters = max(1, LABEL_MAX_TOKENS // LABEL_RESPONSE_TOKENS_PER_CLUSTER)
+    if CLUSTER_BATCH_SIZE:
+        max_clusters = min(max_clusters, CLUSTER_BATCH_SIZE)
+    for batch in pack_batches(fitted, budget, max_clusters):
         _send(batch)
     return out
 
@@ -250,11 +339,46 @@ def compose_digest(
 ) -> str:
     compact = [{"label": c.get("label", "Cluster"), "bullets": c.get("bullets", [])} for c in labeled_clusters]
     prompt = prompt_template.format(topic=topic, days=days, top_k=top_k)
+    fitted_papers, compact = fit_digest_payload(top_papers or [], compact)
     payload = (
-        f"{prompt}\n\nTOP_PAPERS:\n{json.dumps(top_papers or [], ensure_ascii=False)}"
+        f"{prompt}\n\nTOP_PAPERS:\n{json.dumps(fitted_papers, ensure_ascii=False)}"
         f"\n\nCLUSTERS:\n{json.dumps(compact, ensure_ascii=False)}"
     )
-    return call_claude(payload)
+    return call_claude(payload, purpose="digest")
+
+def compose_rollup_digest(
+    topic: str,
+    days: int,
+    top_k: int,
+    weekly: List[Dict[str, Any]],
+    prompt_template: str,
+    top_papers: Optional[List[Dict[str, Any]]] = None,
+) -> str:
+    """
+    Merge-and-summarize step for monthly roll-ups: one call over the stored weekly cluster
+    summaries instead of a month of abstracts.
+    """
+    compact = [
+        {
+            "week": week.get("week_start"),
+            "clusters": [
+                {
+                    "label": c.get("label", "Cluster"),
+                    "bullets": c.get("bullets", []),
+                    "papers": [p.get("title") for p in c.get("topPapers", []) if p.get("title")],
+                }
+                for c in week.get("clusters", [])
+            ],
+        }
+        for week in weekly
+    ]
+    prompt = prompt_template.format(topic=topic, days=days, top_k=top_k)
+    fitted_papers, compact = fit_digest_payload(top_papers or [], compact)
+    payload = (
+        f"{prompt}\n\nTOP_PAPERS:\n{json.dumps(fitted_papers, ensure_ascii=False)}"
+        f"\n\nWEEKLY_CLUSTERS:\n{json.dumps(compact, ensure_ascii=False)}"
+    )
+    return call_claude(payload, purpose="rollup")
 
 def maybe_tts_fish_audio(text: str) -> Optional[str]:
     return None